@@ -3,29 +3,216 @@ ClawMCP Gateway - MCP 服务管理平台
 自动启动 MCP 服务 + 提供工具元数据（让大模型自己生成 SKILL）
 """
 import os
+import re
 import sys
 import json
 import asyncio
-import subprocess
 import signal
 import time
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+import copy
+import contextlib
+import itertools
+from collections import OrderedDict, defaultdict
+from typing import AsyncIterator, Callable, Dict, List, Mapping, Optional, Tuple, Union
+from dataclasses import dataclass, field
 from aiohttp import web
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+try:
+    import orjson
+    
+    def json_dumps(obj) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # 超过 64 位的整数等 orjson 不支持的值，回退标准库
+            return json.dumps(obj).encode()
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+    json_loads = json.loads
+
 
 # ==================== 配置 ====================
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_PATH = os.path.join(BASE_DIR, "templates/index.html")
+INDEX_HEADERS = {"Cache-Control": "public, max-age=300"}
 CONFIG_PATH = os.getenv("CLAWMCP_CONFIG", os.path.join(BASE_DIR, "configs/config.yaml"))
 PORT = int(os.getenv("CLAWMCP_PORT", "8080"))
 INTERNAL_HOST = "0.0.0.0"
+LOG_DIR = os.getenv("CLAWMCP_LOG_DIR", "/tmp")
+
+# MCP 响应超时（秒）
+START_TIMEOUT = 10
+LIST_TIMEOUT = 10
+CALL_TIMEOUT = 60
+
+# 自动启动时同时拉起的最大服务数
+START_CONCURRENCY = int(os.getenv("CLAWMCP_START_CONCURRENCY", "16"))
+
+# tools/list 结果缓存时间（秒）
+TOOLS_CACHE_TTL = 1.5
+
+# 单次 batch_call 最多包含的调用数
+BATCH_MAX = int(os.getenv("CLAWMCP_BATCH_MAX", "64"))
+
+# 服务列表响应缓存时间（秒）
+SERVICES_CACHE_TTL = 0.5
+
+# MCP stdout 单帧上限（大结果如网页抓取、文件内容可达数 MB）
+STREAM_LIMIT = int(os.getenv("CLAWMCP_STREAM_LIMIT", str(64 << 20)))
+
+
+# ==================== 配置缓存 ====================
+
+# path -> (mtime, size, parsed)，按最近使用排序
+_YAML_CACHE: "OrderedDict[str, Tuple[float, int, dict]]" = OrderedDict()
+_YAML_CACHE_MAX = 100
+
+
+def _load_yaml_cached(path: str) -> dict:
+    """加载 YAML（文件未变化时直接返回缓存副本）"""
+    st = os.stat(path)
+    entry = _YAML_CACHE.get(path)
+    if entry and entry[0] == st.st_mtime and entry[1] == st.st_size:
+        _YAML_CACHE.move_to_end(path)
+        return copy.deepcopy(entry[2])
+    
+    with open(path, "rb") as f:
+        data = yaml.load(f, Loader=SafeLoader) or {}
+    
+    _YAML_CACHE[path] = (st.st_mtime, st.st_size, data)
+    _YAML_CACHE.move_to_end(path)
+    if len(_YAML_CACHE) > _YAML_CACHE_MAX:
+        _YAML_CACHE.popitem(last=False)
+    return copy.deepcopy(data)
+
+
+# ==================== JSON-RPC ====================
+
+# 固定不变的帧，启动时只编码一次（initialize 总是子进程收到的第一个请求，id 固定为 1）
+INITIALIZE_ID = 1
+INITIALIZE_FRAME = json_dumps({
+    "jsonrpc": "2.0",
+    "id": INITIALIZE_ID,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2024-11-05",
+        "capabilities": {},
+        "clientInfo": {"name": "gateway", "version": "1.0"}
+    }
+}) + b"\n"
+INITIALIZED_FRAME = json_dumps({
+    "jsonrpc": "2.0",
+    "method": "notifications/initialized"
+}) + b"\n"
+
+
+# orjson 不接受 NaN/Infinity，且超过 64 位的整数会被解码成 float；
+# 含 20 位以上数字串的帧直接交给标准库 json，orjson 解码失败时同样回退
+_LONG_DIGITS = re.compile(rb"\d{20}")
+# 帧无法解码时，从原始字节中找出请求 id，让对应调用立即失败
+_FRAME_ID = re.compile(rb'"id"\s*:\s*(\d+)')
+
+
+def decode_frame(line: bytes):
+    """解码 MCP JSON 帧（orjson 优先，必要时回退标准库 json），失败时抛出 ValueError"""
+    if json_loads is not json.loads and not _LONG_DIGITS.search(line):
+        try:
+            return json_loads(line)
+        except ValueError:
+            pass
+    return json.loads(line)
+
+
+class InvalidFrame(Exception):
+    """MCP 输出的帧无法交给调用方（无法解码或超长）"""
+
+
+class FrameTooLarge(InvalidFrame):
+    """MCP 输出的单帧超过 STREAM_LIMIT，已被丢弃"""
+
+
+async def _readline(stream: asyncio.StreamReader) -> bytes:
+    """读取一行；超过 STREAM_LIMIT 时丢弃到行尾并抛出 FrameTooLarge"""
+    try:
+        return await stream.readuntil(b"\n")
+    except asyncio.LimitOverrunError as e:
+        consumed = e.consumed
+    while True:
+        await stream.readexactly(consumed)
+        try:
+            await stream.readuntil(b"\n")
+            break
+        except asyncio.LimitOverrunError as e:
+            consumed = e.consumed
+    raise FrameTooLarge(f"MCP response exceeds {STREAM_LIMIT} bytes")
+
+
+async def read_frame(stream: asyncio.StreamReader) -> bytes:
+    """读取一帧 MCP 消息：按行分隔，兼容 Content-Length 头部分帧；EOF 时返回空 bytes"""
+    try:
+        line = await _readline(stream)
+    except asyncio.IncompleteReadError as e:
+        return e.partial
+    
+    if line[:15].lower() != b"content-length:":
+        return line
+    try:
+        length = int(line[15:])
+    except ValueError:
+        return line
+    if length < 0:
+        return line
+    
+    # LSP 风格分帧：头部以空行结束，随后是定长 body
+    try:
+        while (await _readline(stream)).strip():
+            pass
+        if length <= STREAM_LIMIT:
+            return await stream.readexactly(length)
+        # 超长 body 分块丢弃，不整块分配
+        while length:
+            n = min(length, STREAM_LIMIT)
+            await stream.readexactly(n)
+            length -= n
+    except asyncio.IncompleteReadError:
+        return b""
+    raise FrameTooLarge(f"MCP response exceeds {STREAM_LIMIT} bytes")
+
+
+# ==================== 环境变量 ====================
+
+def build_env(env_spec: List[Dict[str, str]], base: Mapping[str, str] = os.environ) -> Optional[dict]:
+    """根据 env 配置构建子进程环境变量，无覆盖项时返回 None（直接继承父进程）"""
+    if not env_spec:
+        return None
+    
+    env = dict(base)
+    for e in env_spec:
+        name = e.get("name", "")
+        value = e.get("value", "")
+        value_from = e.get("valueFrom", "")
+        
+        if value:
+            env[name] = value
+        elif value_from and value_from.startswith("env:"):
+            v = base.get(value_from[4:])
+            if v is not None:
+                env[name] = v
+    return env
 
 
 # ==================== 数据模型 ====================
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MCPService:
     name: str
     display_name: str
@@ -35,14 +222,20 @@ class MCPService:
     env: List[Dict[str, str]]
     port: int
     enabled: bool
+    argv: Tuple[str, ...] = ()
 
 
-@dataclass
+@dataclass(slots=True)
 class RunningMCP:
-    process: subprocess.Popen
+    process: asyncio.subprocess.Process
     port: int
     started_at: float
-    request_id: int = 2
+    next_id: Callable[[], int] = field(default_factory=lambda: itertools.count(INITIALIZE_ID + 1).__next__)
+    pending: Dict[int, asyncio.Future] = field(default_factory=dict)
+    reader_task: Optional[asyncio.Task] = None
+    tools_cache: Optional[Tuple[float, List[dict]]] = None
+    tools_task: Optional[asyncio.Task] = None
+    progress: Dict[str, asyncio.Queue] = field(default_factory=dict)
 
 
 # ==================== MCP 管理器 ====================
@@ -53,6 +246,12 @@ class MCPManager:
     def __init__(self):
         self.config: Dict[str, MCPService] = {}
         self.running: Dict[str, RunningMCP] = {}
+        self._env_cache: Dict[str, dict] = {}
+        self._start_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._progress_seq = itertools.count(1)
+        self.catalog: Dict[str, dict] = {}
+        # list_services 响应缓存 (生成时间, body)，服务状态变化时清空
+        self.services_body: Optional[Tuple[float, bytes]] = None
     
     def load_config(self, path: str) -> None:
         """加载配置"""
@@ -60,132 +259,245 @@ class MCPManager:
             print(f"Config not found: {path}")
             return
         
-        with open(path) as f:
-            data = yaml.safe_load(f)
+        data = _load_yaml_cached(path)
         
         self.config.clear()
+        self._env_cache.clear()
+        self.services_body = None
         for svc in data.get("mcp", {}).get("enabled", []):
             if svc.get("enabled", True):
+                command = svc.get("command", "python3")
+                args = svc.get("args") or []
+                if not isinstance(args, list):
+                    print(f"Skipping {svc['name']}: args must be a list")
+                    continue
                 self.config[svc["name"]] = MCPService(
                     name=svc["name"],
                     display_name=svc.get("displayName", svc["name"]),
                     description=svc.get("description", ""),
-                    command=svc.get("command", "python3"),
-                    args=svc.get("args", []),
+                    command=command,
+                    args=args,
                     env=svc.get("env", []),
                     port=svc.get("port", 3001),
-                    enabled=True
+                    enabled=True,
+                    # 命令不预先解析，由 exec 按子进程环境的 PATH 查找
+                    argv=(command, *args)
                 )
         
+        # 服务列表中不随请求变化的部分
+        self.catalog = {name: {
+            "name": name,
+            "displayName": svc.display_name,
+            "description": svc.description
+        } for name, svc in self.config.items()}
+        
         print(f"Loaded {len(self.config)} services")
     
-    def _build_env(self, svc: MCPService) -> dict:
-        """构建环境变量"""
-        env = os.environ.copy()
-        for e in svc.env:
-            name = e.get("name", "")
-            value = e.get("value", "")
-            value_from = e.get("valueFrom", "")
-            
-            if value:
-                env[name] = value
-            elif value_from and value_from.startswith("env:"):
-                key = value_from[4:]
-                if key in os.environ:
-                    env[name] = os.environ[key]
+    def _build_env(self, svc: MCPService) -> Optional[dict]:
+        """构建环境变量（按服务缓存，重新加载配置时失效）"""
+        if svc.name in self._env_cache:
+            return self._env_cache[svc.name]
+        
+        env = build_env(svc.env)
+        self._env_cache[svc.name] = env
         return env
     
     async def start_service(self, name: str) -> bool:
-        """启动 MCP 服务"""
+        """启动 MCP 服务（同一服务的并发启动请求只拉起一个进程）"""
         if name not in self.config:
             return False
         
+        async with self._start_locks[name]:
+            return await self._start(name)
+    
+    async def _start(self, name: str) -> bool:
         # 已运行
         if name in self.running:
             proc = self.running[name].process
-            if proc.poll() is None:
+            if proc.returncode is None:
                 return True
         
         svc = self.config[name]
         
         try:
-            # 构建命令
-            cmd = [svc.command] + svc.args
             env = self._build_env(svc)
             
-            # 启动进程
-            proc = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                env=env,
-                start_new_session=True
-            )
+            # stderr 单独写日志文件，stdout 只承载 JSON-RPC；
+            # 子进程持有自己的 fd 副本，父进程启动后即可关闭
+            with open(os.path.join(LOG_DIR, f"mcp-{name}.err"), "ab", buffering=0) as stderr_fh:
+                proc = await asyncio.create_subprocess_exec(
+                    *svc.argv,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=stderr_fh,
+                    env=env,
+                    start_new_session=True,
+                    limit=STREAM_LIMIT
+                )
             
-            self.running[name] = RunningMCP(
+            running = RunningMCP(
                 process=proc,
                 port=svc.port,
                 started_at=time.time()
             )
+            running.reader_task = asyncio.create_task(self._read_loop(name, running))
+            self.running[name] = running
+            self.services_body = None
             
-            # 等待启动
-            await asyncio.sleep(5)
-            
-            # MCP 初始化
-            await self._send(name, {
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "initialize",
-                "params": {
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {},
-                    "clientInfo": {"name": "gateway", "version": "1.0"}
-                }
-            })
-            
-            await asyncio.sleep(1)
-            
-            # notifications/initialized
-            await self._send(name, {
-                "jsonrpc": "2.0",
-                "method": "notifications/initialized"
-            })
+            # MCP 初始化，initialized 通知随 initialize 一次写入（帧已预编码）
+            await self._send_frame(name, INITIALIZE_ID, INITIALIZE_FRAME + INITIALIZED_FRAME, START_TIMEOUT)
             
             print(f"Started {name} on port {svc.port}")
             return True
             
         except Exception as e:
             print(f"Failed to start {name}: {e}")
+            await self.stop_service(name)
             return False
     
-    async def _send(self, name: str, data: dict) -> None:
+    async def _write(self, name: str, frame: bytes) -> None:
         if name not in self.running:
             return
         proc = self.running[name].process
-        proc.stdin.write((json.dumps(data) + "\n").encode())
-        proc.stdin.flush()
+        proc.stdin.write(frame)
+        await proc.stdin.drain()
+    
+    async def _send_frame(self, name: str, req_id: int, frame: bytes, timeout: float) -> dict:
+        """写入已编码好的请求帧，等待 req_id 的响应"""
+        running = self.running[name]
+        fut = asyncio.get_running_loop().create_future()
+        running.pending[req_id] = fut
+        try:
+            await self._write(name, frame)
+            return await asyncio.wait_for(fut, timeout=timeout)
+        finally:
+            running.pending.pop(req_id, None)
+    
+    async def _request(self, name: str, method: str, params: dict, timeout: float) -> dict:
+        """发送 JSON-RPC 请求，等待同 id 的响应"""
+        req_id = self.running[name].next_id()
+        return await self._send_frame(name, req_id, json_dumps({
+            "jsonrpc": "2.0",
+            "id": req_id,
+            "method": method,
+            "params": params
+        }) + b"\n", timeout)
+    
+    async def _request_many(self, name: str, requests: List[Tuple[str, dict]],
+                            timeout: float) -> List[Union[dict, Exception]]:
+        """一次写入多个 JSON-RPC 请求，按顺序返回各自的响应；
+        各项独立等待，出错或超时的项返回对应异常，不影响其它项"""
+        running = self.running[name]
+        loop = asyncio.get_running_loop()
+        
+        ids, futs, frames = [], [], []
+        for method, params in requests:
+            req_id = running.next_id()
+            fut = loop.create_future()
+            running.pending[req_id] = fut
+            ids.append(req_id)
+            futs.append(fut)
+            frames.append(json_dumps({
+                "jsonrpc": "2.0",
+                "id": req_id,
+                "method": method,
+                "params": params
+            }) + b"\n")
+        
+        try:
+            await self._write(name, b"".join(frames))
+            await asyncio.wait(futs, timeout=timeout)
+        finally:
+            for req_id in ids:
+                running.pending.pop(req_id, None)
+        
+        results = []
+        for fut in futs:
+            if fut.done():
+                results.append(fut.exception() or fut.result())
+            else:
+                fut.cancel()
+                results.append(asyncio.TimeoutError())
+        return results
+    
+    async def _read_loop(self, name: str, running: RunningMCP) -> None:
+        """读取 MCP 输出，按 id 分发响应（跳过日志等非 JSON 行）"""
+        stdout = running.process.stdout
+        try:
+            while True:
+                try:
+                    line = await read_frame(stdout)
+                except FrameTooLarge as e:
+                    # 无法得知超长帧属于哪个请求，等待中的请求立即失败，不必等到超时
+                    print(f"{name}: {e}")
+                    self._fail_pending(running, e)
+                    continue
+                if not line:
+                    break
+                # 只解析 JSON 对象帧，日志等其它输出直接跳过
+                if not line.startswith(b"{"):
+                    continue
+                try:
+                    resp = decode_frame(line)
+                except ValueError as e:
+                    # 带 id 的坏帧不能静默丢弃，否则调用方要等到超时
+                    m = _FRAME_ID.search(line)
+                    fut = running.pending.pop(int(m.group(1)), None) if m else None
+                    if fut and not fut.done():
+                        print(f"{name}: invalid JSON response: {e}")
+                        fut.set_exception(InvalidFrame("Invalid JSON response from MCP"))
+                    continue
+                if not isinstance(resp, dict):
+                    continue
+                if "method" in resp:
+                    # 进度通知转给对应的流式调用
+                    if resp["method"] == "notifications/progress":
+                        params = resp.get("params") or {}
+                        queue = running.progress.get(params.get("progressToken"))
+                        if queue:
+                            queue.put_nowait(params)
+                    continue
+                fut = running.pending.pop(resp.get("id"), None)
+                if fut and not fut.done():
+                    fut.set_result(resp)
+        finally:
+            self._fail_pending(running, ConnectionError(f"{name} exited"))
+            self.services_body = None
+    
+    def _fail_pending(self, running: RunningMCP, exc: Exception) -> None:
+        """让该服务所有等待中的请求以 exc 失败"""
+        for fut in running.pending.values():
+            if not fut.done():
+                fut.set_exception(exc)
+        running.pending.clear()
     
     async def stop_service(self, name: str) -> bool:
         """停止 MCP 服务"""
         if name not in self.running:
             return True
         
-        proc = self.running[name].process
-        proc.terminate()
-        try:
-            proc.wait(timeout=5)
-        except:
-            proc.kill()
+        running = self.running.pop(name)
+        self.services_body = None
+        proc = running.process
+        if proc.returncode is None:
+            proc.terminate()
+            try:
+                await asyncio.wait_for(proc.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        if running.reader_task:
+            running.reader_task.cancel()
         
-        del self.running[name]
         print(f"Stopped {name}")
         return True
     
     async def stop_all(self, app=None) -> None:
-        """停止所有服务"""
-        for name in list(self.running.keys()):
-            await self.stop_service(name)
+        """停止所有服务（并发）"""
+        await asyncio.gather(
+            *(self.stop_service(name) for name in list(self.running)),
+            return_exceptions=True
+        )
     
     def get_status(self, name: str) -> str:
         """获取状态"""
@@ -193,67 +505,140 @@ class MCPManager:
             return "unknown"
         if name not in self.running:
             return "stopped"
-        return "running" if self.running[name].process.poll() is None else "stopped"
+        return "running" if self.running[name].process.returncode is None else "stopped"
     
     async def list_tools(self, name: str) -> List[dict]:
-        """获取工具列表"""
+        """获取工具列表（短时缓存，合并仪表盘轮询）"""
         if name not in self.running:
             return []
         
         running = self.running[name]
+        if running.tools_cache and time.monotonic() - running.tools_cache[0] < TOOLS_CACHE_TTL:
+            return running.tools_cache[1]
         
-        await self._send(name, {
-            "jsonrpc": "2.0",
-            "id": running.request_id,
-            "method": "tools/list",
-            "params": {}
-        })
-        running.request_id += 1
-        
-        await asyncio.sleep(2)
-        
+        # 并发请求共用同一次 tools/list
+        if running.tools_task is None or running.tools_task.done():
+            running.tools_task = asyncio.create_task(self._fetch_tools(name, running))
+        return await asyncio.shield(running.tools_task)
+    
+    async def _fetch_tools(self, name: str, running: RunningMCP) -> List[dict]:
+        """请求 tools/list 并写入缓存（失败时缓存空列表）"""
         try:
-            line = running.process.stdout.readline()
-            if line:
-                resp = json.loads(line)
-                return resp.get("result", {}).get("tools", [])
-        except:
-            pass
+            resp = await self._request(name, "tools/list", {}, LIST_TIMEOUT)
+            tools = resp.get("result", {}).get("tools", [])
+        except (asyncio.TimeoutError, ConnectionError, InvalidFrame):
+            tools = []
         
-        return []
+        running.tools_cache = (time.monotonic(), tools)
+        return tools
     
     async def call_tool(self, name: str, tool: str, arguments: dict) -> dict:
         """调用工具"""
         if name not in self.running:
             raise web.HTTPBadRequest(text=f"Service {name} not running")
         
-        running = self.running[name]
+        try:
+            resp = await self._request(name, "tools/call", {
+                "name": tool,
+                "arguments": arguments
+            }, CALL_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionError):
+            raise web.HTTPInternalServerError(text="No response from MCP")
+        except InvalidFrame as e:
+            raise web.HTTPInternalServerError(text=str(e))
         
-        await self._send(name, {
-            "jsonrpc": "2.0",
-            "id": running.request_id,
-            "method": "tools/call",
-            "params": {"name": tool, "arguments": arguments}
-        })
-        running.request_id += 1
+        if "result" in resp:
+            return resp["result"]
+        if "error" in resp:
+            raise web.HTTPInternalServerError(text=str(resp["error"]))
         
-        await asyncio.sleep(5)
+        raise web.HTTPInternalServerError(text="No response from MCP")
+    
+    async def call_tools_batch(self, name: str, calls: List[Tuple[str, dict]]) -> List[dict]:
+        """批量调用工具（一次写入 stdin），每项返回 result 或 error"""
+        if name not in self.running:
+            raise web.HTTPBadRequest(text=f"Service {name} not running")
         
-        line = running.process.stdout.readline()
-        if line:
-            resp = json.loads(line)
-            if "result" in resp:
-                return resp["result"]
-            if "error" in resp:
-                raise web.HTTPInternalServerError(text=str(resp["error"]))
+        try:
+            resps = await self._request_many(name, [
+                ("tools/call", {"name": tool, "arguments": arguments})
+                for tool, arguments in calls
+            ], CALL_TIMEOUT)
+        except ConnectionError:
+            raise web.HTTPInternalServerError(text="No response from MCP")
         
-        raise web.HTTPInternalServerError(text="No response from MCP")
+        results = []
+        for resp in resps:
+            if isinstance(resp, InvalidFrame):
+                results.append({"error": str(resp)})
+            elif isinstance(resp, Exception):
+                results.append({"error": "No response from MCP"})
+            elif "result" in resp:
+                results.append({"result": resp["result"]})
+            else:
+                results.append({"error": resp.get("error", "No response from MCP")})
+        return results
+    
+    async def call_tool_stream(self, name: str, tool: str, arguments: dict) -> AsyncIterator[dict]:
+        """调用工具，依次产出进度通知 {"progress": ...} 和最终的 {"result": ...} / {"error": ...}"""
+        running = self.running[name]
+        token = f"gateway-{next(self._progress_seq)}"
+        queue: asyncio.Queue = asyncio.Queue()
+        running.progress[token] = queue
+        
+        call = asyncio.create_task(self._request(name, "tools/call", {
+            "name": tool,
+            "arguments": arguments,
+            "_meta": {"progressToken": token}
+        }, CALL_TIMEOUT))
+        get = None
+        try:
+            while not call.done():
+                get = asyncio.ensure_future(queue.get())
+                await asyncio.wait({get, call}, return_when=asyncio.FIRST_COMPLETED)
+                if get.done():
+                    yield {"progress": get.result()}
+                else:
+                    get.cancel()
+            
+            while not queue.empty():
+                yield {"progress": queue.get_nowait()}
+            
+            try:
+                resp = call.result()
+            except (asyncio.TimeoutError, ConnectionError):
+                yield {"error": "No response from MCP"}
+                return
+            except InvalidFrame as e:
+                yield {"error": str(e)}
+                return
+            
+            if "result" in resp:
+                yield {"result": resp["result"]}
+            else:
+                yield {"error": resp.get("error", "No response from MCP")}
+        finally:
+            # 客户端断开时也会走到这里：取消未完成的等待，已完成的调用取走异常，避免 "never retrieved" 日志
+            running.progress.pop(token, None)
+            if get is not None:
+                get.cancel()
+            if not call.done():
+                call.cancel()
+            elif not call.cancelled():
+                call.exception()
     
     async def auto_start(self) -> None:
-        """自动启动所有启用的服务"""
-        for name, svc in self.config.items():
-            if svc.enabled:
-                await self.start_service(name)
+        """自动启动所有启用的服务（并发，限制同时启动数量）"""
+        sem = asyncio.Semaphore(START_CONCURRENCY)
+        
+        async def start(name: str) -> bool:
+            async with sem:
+                return await self.start_service(name)
+        
+        await asyncio.gather(
+            *(start(name) for name, svc in self.config.items() if svc.enabled),
+            return_exceptions=True
+        )
 
 
 # ==================== 全局管理器 ====================
@@ -263,11 +648,16 @@ manager = MCPManager()
 
 # ==================== 请求处理 ====================
 
+def json_response(data, status: int = 200) -> web.Response:
+    """JSON 响应（orjson 可用时直接输出 bytes）"""
+    return web.Response(body=json_dumps(data), status=status, content_type="application/json")
+
+
 async def health(request):
     """健康检查"""
     running = sum(1 for name in manager.config if manager.get_status(name) == "running")
     
-    return web.json_response({
+    return json_response({
         "status": "healthy",
         "version": "1.0.0",
         "services_total": len(manager.config),
@@ -277,29 +667,34 @@ async def health(request):
 
 async def list_services(request):
     """获取所有服务"""
+    now = time.monotonic()
+    cached = manager.services_body
+    if cached and now - cached[0] < SERVICES_CACHE_TTL:
+        return web.Response(body=cached[1], content_type="application/json")
+    
     result = []
-    for name, svc in manager.config.items():
+    for name, item in manager.catalog.items():
         status = manager.get_status(name)
         
         result.append({
-            "name": name,
-            "displayName": svc.display_name,
-            "description": svc.description,
+            **item,
             "status": status,
-            "port": svc.port if status == "running" else None
+            "port": manager.config[name].port if status == "running" else None
         })
     
-    return web.json_response({"services": result})
+    body = json_dumps({"services": result})
+    manager.services_body = (now, body)
+    return web.Response(body=body, content_type="application/json")
 
 
 async def get_service(request):
     """获取服务详情"""
     name = request.match_info['name']
     
-    if name not in manager.config:
+    item = manager.catalog.get(name)
+    if item is None:
         raise web.HTTPNotFound(text=f"Service {name} not found")
     
-    svc = manager.config[name]
     status = manager.get_status(name)
     
     # 获取工具列表
@@ -307,13 +702,7 @@ async def get_service(request):
     if status == "running":
         tools = await manager.list_tools(name)
     
-    return web.json_response({
-        "name": name,
-        "displayName": svc.display_name,
-        "description": svc.description,
-        "status": status,
-        "tools": tools
-    })
+    return json_response({**item, "status": status, "tools": tools})
 
 
 async def start_service(request):
@@ -326,7 +715,7 @@ async def start_service(request):
     success = await manager.start_service(name)
     
     if success:
-        return web.json_response({"success": True, "message": f"{name} started"})
+        return json_response({"success": True, "message": f"{name} started"})
     
     raise web.HTTPInternalServerError(text=f"Failed to start {name}")
 
@@ -336,33 +725,80 @@ async def stop_service(request):
     name = request.match_info['name']
     
     await manager.stop_service(name)
-    return web.json_response({"success": True, "message": f"{name} stopped"})
+    return json_response({"success": True, "message": f"{name} stopped"})
 
 
-async def call_tool(request):
-    """调用工具"""
+async def read_call_request(request) -> Tuple[str, object]:
+    """取服务名并解析请求体 JSON（服务不存在 404，JSON 非法 400）"""
     name = request.match_info['name']
     
     if name not in manager.config:
         raise web.HTTPNotFound(text=f"Service {name} not found")
     
     try:
-        data = await request.json()
-    except:
+        data = json_loads(await request.read())
+    except ValueError:
         raise web.HTTPBadRequest(text="Invalid JSON")
     
-    tool = data.get("tool")
-    arguments = data.get("arguments", {})
-    
-    if not tool:
+    return name, data
+
+
+def parse_call(data) -> Tuple[str, dict]:
+    """校验单个调用 {"tool": ..., "arguments": ...}，返回 (tool, arguments)"""
+    if not isinstance(data, dict) or not data.get("tool"):
         raise web.HTTPBadRequest(text="tool is required")
+    return data["tool"], data.get("arguments", {})
+
+
+async def call_tool(request):
+    """调用工具"""
+    name, data = await read_call_request(request)
+    tool, arguments = parse_call(data)
     
     result = await manager.call_tool(name, tool, arguments)
-    return web.json_response({"success": True, "result": result})
+    return json_response({"success": True, "result": result})
+
+
+async def call_stream(request):
+    """流式调用工具（NDJSON：进度通知逐行推送，最后一行为结果或错误）"""
+    name, data = await read_call_request(request)
+    tool, arguments = parse_call(data)
+    
+    if manager.get_status(name) != "running":
+        raise web.HTTPBadRequest(text=f"Service {name} not running")
+    
+    resp = web.StreamResponse()
+    resp.content_type = "application/x-ndjson"
+    await resp.prepare(request)
+    async with contextlib.aclosing(manager.call_tool_stream(name, tool, arguments)) as events:
+        try:
+            async for event in events:
+                await resp.write(json_dumps(event) + b"\n")
+        except ConnectionResetError:
+            raise
+        except Exception as e:
+            # 响应头已发出，错误只能作为最后一行返回
+            await resp.write(json_dumps({"error": str(e)}) + b"\n")
+    await resp.write_eof()
+    return resp
+
+
+async def batch_call(request):
+    """批量调用工具"""
+    name, data = await read_call_request(request)
+    
+    if not isinstance(data, list) or not data:
+        raise web.HTTPBadRequest(text="a non-empty list of calls is required")
+    if len(data) > BATCH_MAX:
+        raise web.HTTPBadRequest(text=f"at most {BATCH_MAX} calls per batch")
+    
+    calls = [parse_call(item) for item in data]
+    results = await manager.call_tools_batch(name, calls)
+    return json_response({"success": True, "results": results})
 
 
 async def web_ui(request):
-    return web.FileResponse(os.path.join(BASE_DIR, "templates/index.html"))
+    return web.FileResponse(INDEX_PATH, headers=INDEX_HEADERS)
 
 
 # ==================== 启动 ====================
@@ -384,12 +820,20 @@ app.router.add_get('/api/v1/services/{name}', get_service)
 app.router.add_post('/api/v1/services/{name}/start', start_service)
 app.router.add_post('/api/v1/services/{name}/stop', stop_service)
 app.router.add_post('/api/v1/services/{name}/call', call_tool)
+app.router.add_post('/api/v1/services/{name}/call_stream', call_stream)
+app.router.add_post('/api/v1/services/{name}/batch_call', batch_call)
 app.router.add_get('/', web_ui)
 
 # 静态文件
-app.router.add_get('/static/{path:.*}', lambda r: web.FileResponse(os.path.join(BASE_DIR, "static", r.match_info['path'])))
+app.router.add_static('/static/', path=os.path.join(BASE_DIR, "static"), show_index=False, follow_symlinks=False)
 
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    
     print(f"Starting ClawMCP Gateway on http://{INTERNAL_HOST}:{PORT}")
     web.run_app(app, host=INTERNAL_HOST, port=PORT, access_log=False)
@@ -4,17 +4,32 @@ MCP HTTP Bridge - 将 MCP stdio 转为 HTTP
 支持完整的 MCP 协议
 """
 import os
+import re
 import sys
 import json
 import asyncio
-import subprocess
+import itertools
 import signal
-from typing import Optional, Dict, Any
+from typing import Any, Callable, Dict, Optional
 from dataclasses import dataclass, field
 
-import httpx
 from aiohttp import web
 
+try:
+    import orjson
+    
+    def json_dumps(obj) -> bytes:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # 超过 64 位的整数等 orjson 不支持的值，回退标准库
+            return json.dumps(obj).encode()
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+    json_loads = json.loads
+
 
 # ==================== 配置 ====================
 
@@ -22,127 +37,206 @@ PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 3001
 MCP_COMMAND = os.getenv("MCP_COMMAND", "python3")
 MCP_ARGS = os.getenv("MCP_ARGS", "-m minimax_mcp.server").split()
 
+# 同时等待 MCP 响应的最大请求数，超出的请求排队
+MAX_INFLIGHT = int(os.getenv("MCP_MAX_INFLIGHT", "16"))
+
+# 设为 1 时以 SO_REUSEPORT 监听，多个 bridge（各自带一个 MCP）可共用同一端口，
+# 由内核分发连接；默认关闭，误启动的第二个实例会因端口占用直接失败（Windows 不支持）
+REUSE_PORT = os.getenv("MCP_REUSE_PORT", "0") == "1"
+
+# MCP stdout 单行上限（大结果如网页抓取、文件内容可达数 MB）
+STREAM_LIMIT = int(os.getenv("MCP_STREAM_LIMIT", str(64 << 20)))
+
+
+# ==================== JSON-RPC ====================
+
+# 握手帧内容固定，导入时编码一次
+INITIALIZE_ID = 1
+INITIALIZE_FRAME = json_dumps({
+    "jsonrpc": "2.0",
+    "id": INITIALIZE_ID,
+    "method": "initialize",
+    "params": {
+        "protocolVersion": "2024-11-05",
+        "capabilities": {},
+        "clientInfo": {"name": "mcp-bridge", "version": "1.0"}
+    }
+}) + b"\n"
+INITIALIZED_FRAME = json_dumps({
+    "jsonrpc": "2.0",
+    "method": "notifications/initialized"
+}) + b"\n"
+
+# orjson 不接受 NaN/Infinity，且超过 64 位的整数会被解码成 float；
+# 含 20 位以上数字串的帧直接交给标准库 json，orjson 解码失败时同样回退
+_LONG_DIGITS = re.compile(rb"\d{20}")
+# 帧无法解码时，从原始字节中找出请求 id，让对应请求立即失败
+_FRAME_ID = re.compile(rb'"id"\s*:\s*(\d+)')
+
+
+def decode_frame(line: bytes):
+    """解码 MCP JSON 帧（orjson 优先，必要时回退标准库 json），失败时抛出 ValueError"""
+    if json_loads is not json.loads and not _LONG_DIGITS.search(line):
+        try:
+            return json_loads(line)
+        except ValueError:
+            pass
+    return json.loads(line)
+
 
 # ==================== MCP 客户端 ====================
 
 @dataclass
 class MCPClient:
     """MCP JSON-RPC 客户端"""
-    process: subprocess.Popen = field(default=None, repr=False)
-    request_id: int = 2
+    process: asyncio.subprocess.Process = field(default=None, repr=False)
+    next_id: Callable[[], int] = field(default_factory=lambda: itertools.count(INITIALIZE_ID + 1).__next__, repr=False)
     pending_requests: Dict[int, asyncio.Future] = field(default_factory=dict)
+    tools_body: Optional[bytes] = field(default=None, repr=False)  # /tools 响应缓存
+    inflight: int = 0  # 正在等待响应的请求数
+    _inflight_sem: asyncio.Semaphore = field(default_factory=lambda: asyncio.Semaphore(MAX_INFLIGHT), repr=False)
+    _write_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
     
     async def start(self):
         """启动 MCP 进程"""
-        env = os.environ.copy()
-        
-        self.process = subprocess.Popen(
-            [MCP_COMMAND] + MCP_ARGS,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            env=env,
-            start_new_session=True
+        self.process = await asyncio.create_subprocess_exec(
+            MCP_COMMAND, *MCP_ARGS,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=None,  # 直接继承 bridge 的 stderr，stdout 只承载 JSON-RPC
+            env=None,  # 原样继承 bridge 的环境，不复制 os.environ
+            start_new_session=True,
+            limit=STREAM_LIMIT
         )
         
         # 启动读取循环
         asyncio.create_task(self._read_loop())
         
-        # 初始化
-        await self._send_request({
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "initialize",
-            "params": {
-                "protocolVersion": "2024-11-05",
-                "capabilities": {},
-                "clientInfo": {"name": "mcp-bridge", "version": "1.0"}
-            }
-        })
-        
-        # 发送 initialized 通知
-        await self._send_notification({
-            "jsonrpc": "2.0",
-            "method": "notifications/initialized"
-        })
+        # 初始化，initialized 通知随 initialize 一次写入
+        await self._send_frame(INITIALIZE_ID, INITIALIZE_FRAME + INITIALIZED_FRAME)
         
         print(f"MCP started, PID: {self.process.pid}", file=sys.stderr)
     
     async def _read_loop(self):
         """读取 MCP 响应"""
-        while self.process and self.process.poll() is None:
-            try:
-                line = self.process.stdout.readline()
-                if not line:
-                    break
-                
-                data = json.loads(line.decode())
-                
-                # 处理响应
-                if "id" in data:
-                    req_id = data["id"]
-                    if req_id in self.pending_requests:
-                        future = self.pending_requests.pop(req_id)
-                        if "result" in data:
-                            future.set_result(data["result"])
-                        elif "error" in data:
-                            future.set_exception(Exception(str(data["error"])))
-                
-                # 处理通知
-                if "method" in data and "id" not in data:
-                    print(f"Notification: {data.get('method')}", file=sys.stderr)
+        stdout = self.process.stdout
+        try:
+            while True:
+                try:
+                    line = await stdout.readuntil(b"\n")
+                    
+                    # 只解析 JSON 对象帧，日志等其它输出直接跳过
+                    if not line.startswith(b"{"):
+                        continue
+                    
+                    try:
+                        data = decode_frame(line)
+                    except ValueError as e:
+                        # 带 id 的坏帧不能静默丢弃，否则调用方要等到超时
+                        m = _FRAME_ID.search(line)
+                        future = self.pending_requests.pop(int(m.group(1)), None) if m else None
+                        if future and not future.done():
+                            print(f"Invalid JSON response: {e}", file=sys.stderr)
+                            future.set_exception(ValueError("Invalid JSON response from MCP"))
+                        continue
                     
-            except Exception as e:
-                print(f"Read error: {e}", file=sys.stderr)
+                    # 处理响应
+                    if "id" in data:
+                        future = self.pending_requests.pop(data["id"], None)
+                        if future and not future.done():
+                            if "result" in data:
+                                future.set_result(data["result"])
+                            elif "error" in data:
+                                future.set_exception(Exception(str(data["error"])))
+                    
+                    # 处理通知
+                    if "method" in data and "id" not in data:
+                        print(f"Notification: {data.get('method')}", file=sys.stderr)
+                
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError as e:
+                    # 超长行丢弃到行尾；无法得知它属于哪个请求，等待中的请求立即失败
+                    await self._discard_line(e.consumed)
+                    print(f"Dropped MCP line larger than {STREAM_LIMIT} bytes", file=sys.stderr)
+                    self._fail_pending(ValueError(f"MCP response exceeds {STREAM_LIMIT} bytes"))
+                except Exception as e:
+                    print(f"Read error: {e}", file=sys.stderr)
+        finally:
+            # MCP 退出（stdout EOF），等待中的请求立即失败，不必等到超时
+            self._fail_pending(ConnectionError("MCP exited"))
+    
+    async def _discard_line(self, consumed: int):
+        """丢弃 stdout 中当前行的剩余部分（含换行）"""
+        stdout = self.process.stdout
+        while True:
+            await stdout.readexactly(consumed)
+            try:
+                await stdout.readuntil(b"\n")
+                return
+            except asyncio.LimitOverrunError as e:
+                consumed = e.consumed
+    
+    def _fail_pending(self, exc: Exception):
+        """让所有等待中的请求以 exc 失败"""
+        for future in self.pending_requests.values():
+            if not future.done():
+                future.set_exception(exc)
+        self.pending_requests.clear()
     
     async def _send_request(self, data: dict) -> Any:
         """发送请求并等待响应"""
-        future = asyncio.get_event_loop().create_future()
-        self.pending_requests[data["id"]] = future
-        
-        self.process.stdin.write((json.dumps(data) + "\n").encode())
-        self.process.stdin.flush()
-        
-        return await asyncio.wait_for(future, timeout=30)
+        return await self._send_frame(data["id"], json_dumps(data) + b"\n")
     
-    async def _send_notification(self, data: dict):
-        """发送通知"""
-        self.process.stdin.write((json.dumps(data) + "\n").encode())
-        self.process.stdin.flush()
+    async def _send_frame(self, req_id: int, frame: bytes) -> Any:
+        """写入已编码好的请求帧，等待 req_id 的响应"""
+        async with self._inflight_sem:
+            self.inflight += 1
+            try:
+                future = asyncio.get_event_loop().create_future()
+                self.pending_requests[req_id] = future
+                
+                async with self._write_lock:
+                    self.process.stdin.write(frame)
+                    await self.process.stdin.drain()
+                
+                return await asyncio.wait_for(future, timeout=30)
+            finally:
+                self.pending_requests.pop(req_id, None)
+                self.inflight -= 1
     
     async def list_tools(self) -> list:
         """列出所有工具"""
         result = await self._send_request({
             "jsonrpc": "2.0",
-            "id": self.request_id,
+            "id": self.next_id(),
             "method": "tools/list",
             "params": {}
         })
-        self.request_id += 1
         return result.get("tools", [])
     
     async def call_tool(self, name: str, arguments: dict) -> Any:
         """调用工具"""
         result = await self._send_request({
             "jsonrpc": "2.0",
-            "id": self.request_id,
+            "id": self.next_id(),
             "method": "tools/call",
             "params": {
                 "name": name,
                 "arguments": arguments
             }
         })
-        self.request_id += 1
         return result
     
     async def stop(self):
         """停止 MCP"""
-        if self.process:
+        if self.process and self.process.returncode is None:
             self.process.terminate()
             try:
-                self.process.wait(timeout=5)
-            except:
+                await asyncio.wait_for(self.process.wait(), timeout=5)
+            except asyncio.TimeoutError:
                 self.process.kill()
+                await self.process.wait()
 
 
 # ==================== 全局客户端 ====================
@@ -152,34 +246,47 @@ mcp_client: Optional[MCPClient] = None
 
 # ==================== HTTP 处理 ====================
 
+TOOLS_HEADERS = {"Cache-Control": "public, max-age=60"}
+
+def json_response(data, status: int = 200) -> web.Response:
+    """JSON 响应（orjson 可用时直接输出 bytes）"""
+    return web.Response(body=json_dumps(data), status=status, content_type="application/json")
+
+
 async def health(request):
     """健康检查"""
-    running = mcp_client and mcp_client.process and mcp_client.process.poll() is None
-    return web.json_response({
+    running = bool(mcp_client and mcp_client.process and mcp_client.process.returncode is None)
+    return json_response({
         "status": "ok" if running else "error",
-        "mcp_running": running
+        "mcp_running": running,
+        "inflight": mcp_client.inflight if mcp_client else 0
     })
 
 
 async def list_tools(request):
     """列出所有工具"""
-    if not mcp_client or mcp_client.process.poll() is not None:
-        return web.json_response({"error": "MCP not running"}, status=400)
+    if not mcp_client or mcp_client.process.returncode is not None:
+        return json_response({"error": "MCP not running"}, status=400)
     
-    try:
-        tools = await mcp_client.list_tools()
-        return web.json_response({
+    # 工具列表在 MCP 进程生命周期内不变，首次成功后直接返回缓存
+    if mcp_client.tools_body is None:
+        try:
+            tools = await mcp_client.list_tools()
+        except Exception as e:
+            return json_response({"error": str(e)}, status=500)
+        mcp_client.tools_body = json_dumps({
             "success": True,
             "tools": tools
         })
-    except Exception as e:
-        return web.json_response({"error": str(e)}, status=500)
+    
+    return web.Response(body=mcp_client.tools_body, content_type="application/json",
+                        headers=TOOLS_HEADERS)
 
 
 async def call_tool(request):
     """调用工具"""
-    if not mcp_client or mcp_client.process.poll() is not None:
-        return web.json_response({"error": "MCP not running"}, status=400)
+    if not mcp_client or mcp_client.process.returncode is not None:
+        return json_response({"error": "MCP not running"}, status=400)
     
     try:
         data = await request.json()
@@ -187,18 +294,18 @@ async def call_tool(request):
         arguments = data.get("arguments", {})
         
         if not tool:
-            return web.json_response({"error": "tool is required"}, status=400)
+            return json_response({"error": "tool is required"}, status=400)
         
         result = await mcp_client.call_tool(tool, arguments)
-        return web.json_response({
+        return json_response({
             "success": True,
             "result": result
         })
         
     except asyncio.TimeoutError:
-        return web.json_response({"error": "Request timeout"}, status=504)
+        return json_response({"error": "Request timeout"}, status=504)
     except Exception as e:
-        return web.json_response({"error": str(e)}, status=500)
+        return json_response({"error": str(e)}, status=500)
 
 
 # ==================== 主程序 ====================
@@ -241,9 +348,9 @@ async def main():
     app.router.add_post('/call', call_tool)
     
     # 启动服务
-    runner = web.AppRunner(app)
+    runner = web.AppRunner(app, access_log=None, handle_signals=False)
     await runner.setup()
-    site = web.TCPSite(runner, '127.0.0.1', PORT)
+    site = web.TCPSite(runner, '127.0.0.1', PORT, reuse_port=REUSE_PORT or None, backlog=2048)
     await site.start()
     
     print(f"MCP HTTP Bridge running on http://127.0.0.1:{PORT}", file=sys.stderr)
@@ -253,4 +360,10 @@ async def main():
 
 
 if __name__ == "__main__":
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+    
     asyncio.run(main())